@@ -1,17 +1,47 @@
 import os
 import sys
 import argparse
+import asyncio
+import functools
+import hashlib
+import importlib
+import inspect
+import json
+import logging
+import subprocess
+import threading
+import time
+import types
+import urllib.request
+from pathlib import Path, PurePath
 import strands
 from dotenv import load_dotenv
 from strands import Agent
-from strands.models import OpenAIModel, AnthropicModel, GeminiModel
 
-# Import specific tools directly to avoid loading IDE-dependent ones
-from serena.tools.file_tools import ListDirTool, ReadFileTool, FindFileTool, SearchForPatternTool
-from serena.tools.cmd_tools import ExecuteShellCommandTool
+# Provider SDKs (strands.models) and the Serena tool tree are imported lazily,
+# only on the code path that needs them.
 
-# Load environment variables from .env
-load_dotenv()
+# Diagnostics go to stderr via logging; stdout is reserved for the final response
+log = logging.getLogger("qa_agent")
+
+_ENV_KEYS = (
+    "PROVIDER",
+    "MODEL_NAME",
+    "OPENAI_API_KEY",
+    "ANTHROPIC_API_KEY",
+    "GEMINI_API_KEY",
+    "GOOGLE_API_KEY",
+    "QAAGENT_LAZY",
+    "QAAGENT_MODELS_URL",
+    "QAAGENT_TOOLS",
+    "QAAGENT_LOG",
+)
+
+@functools.lru_cache(maxsize=1)
+def _init_env():
+    """Load .env once and return a read-only snapshot of the variables we use."""
+    load_dotenv()
+    return types.MappingProxyType({k: os.environ.get(k) for k in _ENV_KEYS})
 
 # Map provider to model config
 # We keep simple map for default model names if not specified
@@ -21,14 +51,115 @@ DEFAULT_MODELS = {
     "gemini": "gemini-3.0-pro",
 }
 
+# Stale-while-revalidate cache of provider default models, refreshed from QAAGENT_MODELS_URL
+_MODELS_CACHE = Path.home() / ".cache" / "qaagent" / "models.json"
+_MODELS_MAX_AGE = 24 * 60 * 60
+
+def _refresh_models(url: str):
+    """Fetch provider default models and atomically replace the cache file."""
+    try:
+        with urllib.request.urlopen(url, timeout=10) as resp:
+            models = json.loads(resp.read().decode("utf-8"))
+        if not isinstance(models, dict):
+            return
+        _MODELS_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = _MODELS_CACHE.with_name(f"{_MODELS_CACHE.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(models), encoding="utf-8")
+        os.replace(tmp, _MODELS_CACHE)
+    except Exception:
+        # Offline or bad payload: keep serving the cached/built-in defaults
+        pass
+
+def _load_models() -> dict:
+    """Return default models per provider without blocking on the network.
+
+    Cached values override DEFAULT_MODELS; a stale or missing cache triggers a
+    background refresh whose result is used from the next run on.
+    """
+    models = dict(DEFAULT_MODELS)
+    try:
+        fresh = time.time() - _MODELS_CACHE.stat().st_mtime < _MODELS_MAX_AGE
+    except OSError:
+        fresh = False
+
+    url = _init_env()["QAAGENT_MODELS_URL"]
+    if not fresh and url:
+        threading.Thread(target=_refresh_models, args=(url,), daemon=True).start()
+
+    try:
+        cached = json.loads(_MODELS_CACHE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        cached = None
+    if isinstance(cached, dict):
+        models.update({k: v for k, v in cached.items() if isinstance(v, str) and v})
+    return models
+
+# Final answers keyed by (repo HEAD, provider, model, query)
+_RESPONSES_CACHE = Path.home() / ".cache" / "qaagent" / "responses"
+
+def _cache_key(query: str, model_id: str, provider: str, tool_names, lazy: bool):
+    """Return a response cache key, or None if the answer cannot be tied to a commit.
+
+    Outside a git repository, or with uncommitted or untracked (non-ignored) files,
+    the codebase is not identified by HEAD alone, so caching is skipped. The
+    exposed tool set is part of the key since it shapes the answer.
+    """
+    cwd = os.getcwd()
+    try:
+        sha = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=cwd, stderr=subprocess.DEVNULL
+        ).strip().decode()
+        dirty = subprocess.check_output(
+            ["git", "status", "--porcelain"], cwd=cwd, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    if dirty:
+        return None
+    tools = "all" if tool_names is None else ",".join(sorted(tool_names))
+    return hashlib.sha256(
+        f"{sha}|{provider}|{model_id}|{tools}|lazy={int(lazy)}|{query}".encode()
+    ).hexdigest()
+
+def _read_cached_response(key: str):
+    try:
+        return (_RESPONSES_CACHE / key).read_text(encoding="utf-8")
+    except OSError:
+        return None
+
+def _write_cached_response(key: str, response: str):
+    try:
+        _RESPONSES_CACHE.mkdir(parents=True, exist_ok=True)
+        tmp = _RESPONSES_CACHE / f"{key}.{os.getpid()}.tmp"
+        tmp.write_text(response, encoding="utf-8")
+        os.replace(tmp, _RESPONSES_CACHE / key)
+    except OSError:
+        pass
+
+# Provider -> (accepted API key env vars, "module:ModelClass")
+# The model class is imported only for the selected provider.
+_PROVIDER_SPEC = {
+    "openai": (("OPENAI_API_KEY",), "strands.models:OpenAIModel"),
+    "anthropic": (("ANTHROPIC_API_KEY",), "strands.models:AnthropicModel"),
+    "gemini": (("GEMINI_API_KEY", "GOOGLE_API_KEY"), "strands.models:GeminiModel"),
+}
+
+# Tools advertised in the system prompt; only these are sent to the model by default
+DEFAULT_TOOLS = ("list_dir", "read_file", "find_file", "search_for_pattern", "execute_shell_command")
+
 class SimpleProject:
+    __slots__ = ("project_root", "_root")
+
     def __init__(self, root: str):
         self.project_root = os.path.abspath(root)
+        # Resolved once so symlinks are compared consistently in validate_relative_path
+        self._root = os.path.realpath(root)
 
     def validate_relative_path(self, relative_path: str):
-        # Basic validation to ensure path is within root
-        abs_path = os.path.abspath(os.path.join(self.project_root, relative_path))
-        if not abs_path.startswith(self.project_root):
+        # Ensure path is within root; commonpath avoids the prefix bug where
+        # /tmp/project_evil would pass a startswith check against /tmp/project
+        candidate = os.path.realpath(os.path.join(self._root, relative_path))
+        if os.path.commonpath((candidate, self._root)) != self._root:
             raise ValueError(f"Path outside root: {relative_path}")
 
     def relative_path_exists(self, relative_path: str) -> bool:
@@ -37,13 +168,15 @@ class SimpleProject:
     def is_ignored_path(self, path: str, ignore_non_source_files: bool = False) -> bool:
         # Simple implementation: Don't ignore anything for now to allow full exploration
         # Could add basic .git check if needed
-        return ".git" in str(path).split(os.path.sep)
+        return ".git" in PurePath(path).parts
     
     def read_file(self, relative_path: str) -> str:
         with open(os.path.join(self.project_root, relative_path), 'r', encoding='utf-8', errors='replace') as f:
             return f.read()
 
 class SimpleAgent:
+    __slots__ = ("_project",)
+
     def __init__(self, root: str):
         self._project = SimpleProject(root)
 
@@ -57,152 +190,420 @@ class SimpleAgent:
         return True
         
     def get_active_tool_names(self) -> list[str]:
-        return ["list_dir", "read_file", "find_file", "search_for_pattern", "execute_shell_command"]
+        return list(DEFAULT_TOOLS)
+
+@functools.lru_cache(maxsize=1)
+def _cached_tool_classes():
+    from serena.tools import ToolRegistry
+    return tuple(ToolRegistry().get_all_tool_classes())
+
+# Tools needing an IDE plugin connection, plus marker base classes that are not real tools
+_UNSAFE_PREFIXES = ("JetBrains", "VSCode", "Sublime", "ToolMarker")
+_UNSAFE_SUFFIXES = ("Marker",)
+
+def _is_unsafe_tool(tool_cls) -> bool:
+    requires_ide = getattr(tool_cls, "requires_ide", None)
+    if requires_ide is not None:
+        return bool(requires_ide)
+    name = tool_cls.__name__
+    return name.startswith(_UNSAFE_PREFIXES) or name.endswith(_UNSAFE_SUFFIXES)
+
+@functools.lru_cache(maxsize=1)
+def _safe_tool_classes():
+    """Tool classes that can run without an IDE, filtered once per process before any constructor runs."""
+    return tuple(
+        c for c in _cached_tool_classes()
+        # Abstract classes or ones without `apply` cannot be instantiated or wrapped
+        if not inspect.isabstract(c)
+        and callable(getattr(c, "apply", None))
+        and not _is_unsafe_tool(c)
+    )
 
-# ... imports
-from serena.tools import ToolRegistry
+@functools.lru_cache(maxsize=None)
+def _cached_signature(tool_cls):
+    # `apply` is defined on the class, so its signature never changes at runtime.
+    # Drop `self` so it matches the bound method the wrapper calls.
+    sig = inspect.signature(tool_cls.apply)
+    return sig.replace(parameters=list(sig.parameters.values())[1:])
 
-# ... (keep SimpleProject/SimpleAgent)
+# Decorated Strands tools keyed by (project root, tool class)
+_DECORATED_TOOLS = {}
 
-def get_serena_tools():
-    """Dynamically load and wrap specific Serena tools for Strands."""
+# Read-only tools whose results can be reused within a session
+_CACHEABLE_TOOLS = frozenset({"ReadFileTool", "ListDirTool", "FindFileTool", "SearchForPatternTool"})
+_TOOL_RESULTS_MAX = 256
+# Shared by all wrappers so a side-effecting tool can invalidate everything.
+# Tools run on worker threads: stores and clears hold the lock, and the generation
+# counter stops a result computed before a clear from being stored after it.
+_TOOL_RESULTS = {}
+_TOOL_RESULTS_LOCK = threading.Lock()
+_tool_results_generation = 0
+_MISSING = object()
+
+def _clear_tool_results():
+    global _tool_results_generation
+    with _TOOL_RESULTS_LOCK:
+        _tool_results_generation += 1
+        _TOOL_RESULTS.clear()
+
+def create_wrapper(tool_cls, agent_impl, cacheable: bool = False):
+    """Return a plain function forwarding to the `apply` method of a `tool_cls` instance.
+
+    The tool is only constructed on the first call, so tools the model never uses
+    cost nothing beyond their metadata. Results of cacheable tools are memoized per
+    argument set; any other tool may change the working tree, so calling one clears
+    the memoized results.
+    """
+    apply = None
+
+    def get_apply():
+        nonlocal apply
+        if apply is None:
+            apply = tool_cls(agent_impl).apply
+        return apply
+
+    # A real function (not functools.partial) is kept: strands.tool reads its
+    # annotations/globals, and the cacheable variant needs a body anyway.
+    if not cacheable:
+        def wrapper(*args, **kwargs):
+            try:
+                return get_apply()(*args, **kwargs)
+            finally:
+                _clear_tool_results()
+        return wrapper
+
+    def wrapper(*args, **kwargs):
+        try:
+            key = (wrapper, args, tuple(sorted(kwargs.items())))
+            hash(key)
+        except TypeError:
+            # Unhashable arguments (e.g. lists) are not memoized
+            return get_apply()(*args, **kwargs)
+        cached = _TOOL_RESULTS.get(key, _MISSING)
+        if cached is not _MISSING:
+            return cached
+        generation = _tool_results_generation
+        result = get_apply()(*args, **kwargs)
+        with _TOOL_RESULTS_LOCK:
+            if generation == _tool_results_generation and len(_TOOL_RESULTS) < _TOOL_RESULTS_MAX:
+                _TOOL_RESULTS[key] = result
+        return result
+    return wrapper
+
+def _tool_name(tool_cls) -> str:
+    # Serena defines get_name_from_cls as a classmethod; no instance needed
+    get_name = getattr(tool_cls, "get_name_from_cls", None)
+    return get_name() if inspect.ismethod(get_name) else tool_cls.__name__
+
+def _build_tool(tool_cls, agent_impl):
+    """Wrap a Serena tool class as a Strands tool from class-level metadata only."""
+    key = (agent_impl.get_project_root(), tool_cls)
+    cached = _DECORATED_TOOLS.get(key)
+    if cached is not None:
+        return cached
+
+    # Create wrapper to maintain metadata; decorated exactly once below
+    wrapper = create_wrapper(tool_cls, agent_impl, tool_cls.__name__ in _CACHEABLE_TOOLS)
+    wrapper.__name__ = _tool_name(tool_cls)
+    wrapper.__doc__ = tool_cls.apply.__doc__
+    wrapper.__signature__ = _cached_signature(tool_cls)
+
+    final_tool = strands.tool(wrapper)
+    _DECORATED_TOOLS[key] = final_tool
+    return final_tool
+
+def _summarize(doc) -> str:
+    """Return the first non-empty line of a docstring."""
+    for line in (doc or "").strip().splitlines():
+        if line.strip():
+            return line.strip()
+    return ""
+
+class LazyToolManager:
+    """Holds Serena tool classes and only instantiates them on demand.
+
+    The agent initially sees a one-line stub per tool plus `discover_tools`;
+    the full schema is registered on the agent the first time a tool is needed.
+    """
+
+    def __init__(self, agent_impl):
+        self._agent_impl = agent_impl
+        self._tool_classes = {}
+        self._tools = None
+
+    def add(self, tool_cls):
+        self._tool_classes[_tool_name(tool_cls)] = tool_cls
+
+    def materialize(self, name: str, agent=None):
+        """Build the real tool for `name` and register it on `agent`, replacing the stub."""
+        # _build_tool memoizes, so each tool is instantiated and decorated once per process
+        tool = _build_tool(self._tool_classes[name], self._agent_impl)
+        if agent is not None:
+            # Drop the stub first; Strands refuses to register a duplicate name
+            agent.tool_registry.registry.pop(name, None)
+            agent.tool_registry.register_tool(tool)
+        return tool
+
+    def _make_stub(self, name: str, tool_cls):
+        manager = self
+
+        def stub(agent=None) -> str:
+            manager.materialize(name, agent)
+            return (f"Tool '{name}' is now loaded. Call it again with its arguments:\n"
+                    f"{tool_cls.apply.__doc__ or ''}")
+
+        stub.__name__ = name
+        stub.__doc__ = _summarize(tool_cls.apply.__doc__) or f"Serena tool {name}."
+        return strands.tool(stub)
+
+    def get_tools(self) -> list:
+        if self._tools is not None:
+            return self._tools
+        manager = self
+
+        def discover_tools(load: list[str], agent=None) -> str:
+            """Load the full definitions of the named tools so they can be called with arguments.
+
+            Args:
+                load: Names of the tools to load.
+            """
+            loaded, unknown = [], []
+            for name in load:
+                if name in manager._tool_classes:
+                    manager.materialize(name, agent)
+                    loaded.append(name)
+                else:
+                    unknown.append(name)
+            result = f"Loaded tools: {', '.join(loaded) or 'none'}."
+            if unknown:
+                result += f" Unknown tools: {', '.join(unknown)}."
+            return result
+
+        tools = [self._make_stub(name, tool_cls) for name, tool_cls in self._tool_classes.items()]
+        tools.append(strands.tool(discover_tools))
+        self._tools = tools
+        return tools
+
+# LazyToolManager per project root, so stubs are decorated once per process
+_LAZY_MANAGERS = {}
+
+def get_serena_tools(tool_names=DEFAULT_TOOLS):
+    """Dynamically load and wrap specific Serena tools for Strands.
+
+    Only tools named in `tool_names` are loaded (pass None for every safe tool);
+    raises ValueError if none of them exist.
+    With QAAGENT_LAZY=1 only summary stubs and a `discover_tools` meta-tool are
+    returned; each tool is instantiated when first used.
+    """
     # Use current working directory as project root
     cwd = os.getcwd()
     agent_impl = SimpleAgent(cwd)
+    # Decorated tools outlive a session; their memoized results must not
+    _clear_tool_results()
 
-    registry = ToolRegistry()
     tools = []
-    
-    # helper to check if tool is safe
-    def is_safe_tool(tool_cls):
-        name = tool_cls.__name__
-        # JetBrains tools require IDE plugin connection
-        if "JetBrains" in name:
-            return False
-        # Skip abstract base classes if they somehow got into registry (unlikely but safe)
-        if name.startswith("Tool") and name.endswith("Marker"): 
-            return False
-        return True
+    lazy = _init_env()["QAAGENT_LAZY"] == "1"
 
-    for tool_cls in registry.get_all_tool_classes():
-        if not is_safe_tool(tool_cls):
-            continue
+    classes = _safe_tool_classes()
+    if tool_names is not None:
+        allowed = frozenset(tool_names)
+        classes = [c for c in classes if _tool_name(c) in allowed]
+        unknown = allowed - {_tool_name(c) for c in classes}
+        if unknown:
+            log.warning("Unknown or unavailable tools ignored: %s", ", ".join(sorted(unknown)))
+        if not classes:
+            raise ValueError(f"None of the requested tools are available: {', '.join(sorted(allowed))}")
+
+    if lazy:
+        manager_key = (cwd, tuple(classes))
+        manager = _LAZY_MANAGERS.get(manager_key)
+        if manager is None:
+            manager = LazyToolManager(agent_impl)
+            for tool_cls in classes:
+                manager.add(tool_cls)
+            _LAZY_MANAGERS[manager_key] = manager
+        return manager.get_tools()
 
+    for tool_cls in classes:
         try:
-            # Instantiate tool with our SimpleAgent
-            tool_instance = tool_cls(agent_impl)
-            
-            func = tool_instance.apply
-            tool_name = tool_instance.get_name_from_cls()
-            
-            # Create wrapper to maintain metadata
-            # Use a factory to capture tool_instance correctly in closure
-            def create_wrapper(instance):
-                def wrapper(*args, **kwargs):
-                    return instance.apply(*args, **kwargs)
-                return wrapper
-
-            wrapper = create_wrapper(tool_instance)
-            
-            wrapper.__name__ = tool_name
-            wrapper.__doc__ = tool_instance.apply.__doc__
-            try:
-                import inspect
-                wrapper.__signature__ = inspect.signature(tool_instance.apply)
-            except:
-                pass
-
-            final_tool = strands.tool(wrapper)
-            tools.append(final_tool)
-            
+            tools.append(_build_tool(tool_cls, agent_impl))
         except Exception as e:
-            # print(f"Warning: Failed to load tool {tool_cls.__name__}: {e}")
+            log.debug("Failed to load tool %s: %s", tool_cls.__name__, e)
             continue
-            
+
     return tools
 
+SYSTEM_PROMPT = """You are a helpful QA Agent for a software repository.
+        Your goal is to answer the user's question by actively exploring the codebase.
+        
+        You have access to a rich set of tools from the 'serena' library.
+        
+        Rules:
+        1. Always start by understanding the directory structure if you are unsure where things are.
+        2. Use relevant tools (e.g. `find_file`, `search_for_pattern`, `read_file`, `execute_shell_command`) to explore.
+        3. Be concise in your final answer but provide sufficient technical detail.
+        4. If you cannot find the answer, state what you tried and why you failed.
+        """
+
+# Max queries in flight in --queries-file mode, to stay within provider rate limits
+_BATCH_CONCURRENCY = 4
+
+def _clean_query(query: str) -> str:
+    # Clean query (remove /ask trigger if present)
+    if query.strip().lower().startswith("/ask"):
+        query = query.strip()[4:].strip()
+        log.info("Cleaned query: %s", query)
+    return query
+
+async def _run_batch(llm_model, tools, queries, cache_keys):
+    """Answer queries concurrently; returns responses (or exceptions) in input order.
+
+    Each query gets its own Agent because an Agent holds conversation state;
+    the model client and tools are shared.
+    """
+    semaphore = asyncio.Semaphore(_BATCH_CONCURRENCY)
+
+    async def run(query, cache_key):
+        async with semaphore:
+            agent = Agent(model=llm_model, tools=tools, system_prompt=SYSTEM_PROMPT)
+            response = await agent.invoke_async(query)
+        if cache_key:
+            _write_cached_response(cache_key, str(response))
+        return response
+
+    return await asyncio.gather(
+        *(run(q, k) for q, k in zip(queries, cache_keys)), return_exceptions=True
+    )
+
+@functools.lru_cache(maxsize=1)
+def _parser():
+    """Build the CLI parser once; main() may be called repeatedly (tests, embedding)."""
+    p = argparse.ArgumentParser(description="GitHub Repository QA Agent")
+    p.add_argument("--query", "-q", type=str, help="Question to ask the agent")
+    p.add_argument("--queries-file", type=str, help="File with one question per line, answered concurrently")
+    p.add_argument("--provider", "-p", type=str, choices=tuple(DEFAULT_MODELS), help="LLM Provider")
+    p.add_argument("--model", "-m", type=str, help="Specific model name (overrides provider default)")
+    p.add_argument("--tools", type=str, help="Comma-separated Serena tool names to expose, or 'all'")
+    p.add_argument("--quiet", action="store_true", help="Only log warnings and errors to stderr")
+    p.add_argument("--no-cache", action="store_true", help="Ignore and do not store cached responses")
+    return p
+
 def main():
-    parser = argparse.ArgumentParser(description="GitHub Repository QA Agent")
-    parser.add_argument("--query", "-q", type=str, help="Question to ask the agent")
-    parser.add_argument("--provider", "-p", type=str, choices=DEFAULT_MODELS.keys(), help="LLM Provider")
-    parser.add_argument("--model", "-m", type=str, help="Specific model name (overrides provider default)")
-    
-    args = parser.parse_args()
+    args = _parser().parse_args()
+    env = _init_env()
+
+    level = "WARNING" if args.quiet else (env["QAAGENT_LOG"] or "INFO").upper()
+    if not isinstance(logging.getLevelName(level), int):
+        level = "INFO"
+    # Configure only our logger; the root logger (strands, httpx, provider SDKs)
+    # stays unconfigured so library INFO output does not reach stderr
+    if not log.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        log.propagate = False
+    log.setLevel(level)
     
     # Priority: Args > Env > Default
-    provider = args.provider or os.getenv("PROVIDER", "openai")
-    model_name_arg = args.model or os.getenv("MODEL_NAME")
+    provider = args.provider or env["PROVIDER"] or "openai"
+    model_name_arg = args.model or env["MODEL_NAME"]
+    
+    model_id = model_name_arg if model_name_arg else _load_models().get(provider, "gpt-5.2")
     
-    model_id = model_name_arg if model_name_arg else DEFAULT_MODELS.get(provider, "gpt-5.2")
+    tools_arg = args.tools or env["QAAGENT_TOOLS"]
+    if not tools_arg:
+        tool_names = DEFAULT_TOOLS
+    elif tools_arg.strip().lower() == "all":
+        tool_names = None
+    else:
+        tool_names = tuple(t.strip() for t in tools_arg.split(",") if t.strip())
     
     # Query might come from args or Env (for easier CI integration if needed)
-    query = args.query
-    if not query:
-        print("Error: Query must be provided via --query argument.", file=sys.stderr)
+    if args.queries_file:
+        try:
+            with open(args.queries_file, encoding="utf-8") as f:
+                queries = [_clean_query(line.strip()) for line in f if line.strip()]
+        except OSError as e:
+            log.error("Cannot read queries file: %s", e)
+            sys.exit(1)
+        if not queries:
+            log.error("Queries file is empty.")
+            sys.exit(1)
+    elif args.query:
+        queries = [_clean_query(args.query)]
+    else:
+        log.error("Query must be provided via --query or --queries-file argument.")
         sys.exit(1)
-
-    # Clean query (remove /ask trigger if present)
-    if query.strip().lower().startswith("/ask"):
-        query = query.strip()[4:].strip()
-        print(f"Cleaned query: {query}", file=sys.stderr)
+    batch = bool(args.queries_file)
     
-    print(f"Initializing QA Agent with model: {model_id} (Provider: {provider})", file=sys.stderr)
+    log.info("Initializing QA Agent with model: %s (Provider: %s)", model_id, provider)
 
     # Instantiate the correct Model class
     # Strands defaults to BedrockModel if a string is passed, so we MUST instantiate the correct class.
-    llm_model = None
-    if provider == "openai":
-         if not os.getenv("OPENAI_API_KEY"):
-             print("Error: OPENAI_API_KEY not found.", file=sys.stderr)
-             sys.exit(1)
-         llm_model = OpenAIModel(model_id=model_id)
-    elif provider == "anthropic":
-         if not os.getenv("ANTHROPIC_API_KEY"):
-             print("Error: ANTHROPIC_API_KEY not found.", file=sys.stderr)
-             sys.exit(1)
-         llm_model = AnthropicModel(model_id=model_id)
-    elif provider == "gemini":
-         if not os.getenv("GEMINI_API_KEY") and not os.getenv("GOOGLE_API_KEY"):
-              print("Error: GEMINI_API_KEY or GOOGLE_API_KEY not found.", file=sys.stderr)
-              sys.exit(1)
-         llm_model = GeminiModel(model_id=model_id)
-    else:
-        print(f"Error: Unknown provider {provider}", file=sys.stderr)
+    spec = _PROVIDER_SPEC.get(provider)
+    if spec is None:
+        log.error("Unknown provider %s", provider)
         sys.exit(1)
 
-    # Load Serena tools
-    print("Loading Serena tools...", file=sys.stderr)
-    serena_tools = get_serena_tools()
-    print(f"Loaded {len(serena_tools)} tools from Serena.", file=sys.stderr)
+    keys, dotted = spec
+    if not any(env[k] for k in keys):
+        log.error("%s not found.", " or ".join(keys))
+        sys.exit(1)
 
-    # Initialize Agent
-    agent = Agent(
-        model=llm_model,
-        tools=serena_tools,
-        system_prompt="""You are a helpful QA Agent for a software repository.
-        Your goal is to answer the user's question by actively exploring the codebase.
-        
-        You have access to a rich set of tools from the 'serena' library.
-        
-        Rules:
-        1. Always start by understanding the directory structure if you are unsure where things are.
-        2. Use relevant tools (e.g. `find_file`, `search_for_pattern`, `read_file`, `execute_shell_command`) to explore.
-        3. Be concise in your final answer but provide sufficient technical detail.
-        4. If you cannot find the answer, state what you tried and why you failed.
-        """
-    )
+    # Same question against the same commit: reuse the previous answer
+    lazy = env["QAAGENT_LAZY"] == "1"
+    cache_keys = [
+        None if args.no_cache else _cache_key(q, model_id, provider, tool_names, lazy) for q in queries
+    ]
+    responses = [_read_cached_response(k) if k else None for k in cache_keys]
+    pending = [i for i, r in enumerate(responses) if r is None]
+    if len(pending) < len(queries):
+        log.info("Using %d cached response(s).", len(queries) - len(pending))
 
-    print("Agent started. Processing query for provider:", provider, file=sys.stderr)
-    try:
-        # Agent is callable
-        response = agent(query)
-        
-        print("\n=== Agent Response ===", file=sys.stderr)
-        print(response)
-        print("======================", file=sys.stderr)
+    if pending:
+        module_name, class_name = dotted.split(":")
+        llm_model = getattr(importlib.import_module(module_name), class_name)(model_id=model_id)
 
-    except Exception as e:
-        print(f"An error occurred: {e}", file=sys.stderr)
+        # Load Serena tools
+        log.info("Loading Serena tools...")
+        try:
+            serena_tools = get_serena_tools(tool_names)
+        except ValueError as e:
+            log.error("%s", e)
+            sys.exit(1)
+        log.info("Loaded %d tools from Serena.", len(serena_tools))
+
+    if pending and batch:
+        log.info("Agent started. Processing %d queries for provider: %s", len(pending), provider)
+        results = asyncio.run(_run_batch(
+            llm_model, serena_tools, [queries[i] for i in pending], [cache_keys[i] for i in pending]
+        ))
+        for i, result in zip(pending, results):
+            responses[i] = result
+    elif pending:
+        # Initialize Agent
+        agent = Agent(model=llm_model, tools=serena_tools, system_prompt=SYSTEM_PROMPT)
+
+        log.info("Agent started. Processing query for provider: %s", provider)
+        try:
+            # Agent is callable
+            response = agent(queries[0])
+            if cache_keys[0]:
+                _write_cached_response(cache_keys[0], str(response))
+            responses[0] = response
+        except Exception as e:
+            log.error("An error occurred: %s", e)
+            return
+
+    print("\n=== Agent Response ===", file=sys.stderr)
+    for query, response in zip(queries, responses):
+        if batch:
+            print(f"## {query}\n")
+        if isinstance(response, Exception):
+            log.error("An error occurred: %s", response)
+            continue
+        print(response)
+    print("======================", file=sys.stderr)
 
 if __name__ == "__main__":
     main()